@@ -0,0 +1,65 @@
+# _diff_kernel.py
+# Kernel perbandingan atribut SLS (luas + kdsubsls) untuk SLS Change Detector
+# - Memakai numba (njit + prange) bila tersedia, fallback ke NumPy
+
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except Exception:
+    # numba opsional; import di lingkungan QGIS bisa gagal bukan hanya karena ImportError
+    HAS_NUMBA = False
+
+
+LUAS_SCALE = 10000  # luas disimpan fixed-point int64 dengan presisi 0.0001
+
+
+def factorize_pair(values_old, values_new):
+    """Kodekan dua list nilai ke int32 dengan kamus bersama (NULL -> -1)"""
+    codes = {}
+
+    def encode(values):
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None or (hasattr(value, "isNull") and value.isNull()):
+                out[i] = -1
+            else:
+                out[i] = codes.setdefault(value, len(codes))
+        return out
+
+    return encode(values_old), encode(values_new)
+
+
+def quantize_luas(luas):
+    """Ubah array luas float64 ke fixed-point int64 (luas * LUAS_SCALE, dibulatkan)"""
+    return np.rint(luas * LUAS_SCALE).astype(np.int64)
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _diff_masks_numba(luas_old, luas_new, kd_old_codes, kd_new_codes, tol):
+        n = len(luas_old)
+        luas_changed = np.empty(n, np.bool_)
+        kd_changed = np.empty(n, np.bool_)
+        for i in prange(n):
+            luas_changed[i] = abs(luas_old[i] - luas_new[i]) > tol
+            kd_changed[i] = kd_old_codes[i] != kd_new_codes[i]
+        return luas_changed, kd_changed
+
+
+def diff_masks(luas_old, luas_new, kd_old_codes, kd_new_codes, tol):
+    """Mask (luas_berubah, kdsubsls_berubah) untuk array yang sudah sejajar.
+
+    luas dan tol boleh float atau fixed-point int64 hasil quantize_luas.
+    """
+    global HAS_NUMBA
+    if HAS_NUMBA:
+        try:
+            return _diff_masks_numba(luas_old, luas_new, kd_old_codes, kd_new_codes, tol)
+        except Exception:
+            # JIT dikompilasi saat pemanggilan (per signature); kompilasi atau threading
+            # layer bisa gagal di dalam QGIS -> matikan numba dan pakai NumPy
+            HAS_NUMBA = False
+    return np.abs(luas_old - luas_new) > tol, kd_old_codes != kd_new_codes
@@ -5,22 +5,345 @@
 
 from qgis.PyQt.QtWidgets import (
     QAction, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-    QPushButton, QFileDialog, QMessageBox, QTableWidget, QTableWidgetItem,
+    QPushButton, QFileDialog, QMessageBox, QTableView,
     QGroupBox, QGridLayout, QDialogButtonBox, QTextEdit, QTabWidget, QToolBar,
     QWidget, QProgressBar
 )
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtCore import Qt, QDateTime, QTimer, QVariant
+from qgis.PyQt.QtCore import Qt, QDateTime, QTimer, QVariant, QAbstractTableModel, QModelIndex
 from qgis.core import (
     QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsField, QgsFields,
     QgsVectorFileWriter, QgsCoordinateReferenceSystem, QgsWkbTypes,
-    QgsFeatureRequest, QgsVectorLayerUtils, QgsFillSymbol, QgsSingleSymbolRenderer
+    QgsFeatureRequest, QgsVectorLayerUtils, QgsFillSymbol, QgsSingleSymbolRenderer,
+    QgsSpatialIndex, QgsFeatureSink, QgsFeatureSource, QgsVectorLayerFeatureSource
 )
 from qgis.utils import iface
 import os
+import sys
 import time
 import csv
+import hashlib
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+
+from ._diff_kernel import LUAS_SCALE, factorize_pair, quantize_luas, diff_masks
+
+try:
+    import shapely
+    HAS_SHAPELY = hasattr(shapely, "STRtree") and hasattr(shapely, "union_all")  # shapely >= 2.0
+except ImportError:
+    HAS_SHAPELY = False
+
+
+GEOMETRY_CHUNK_SIZE = 1000  # pasangan geometri per task ThreadPoolExecutor
+
+
+def bbox_close(bbox_a, bbox_b, tolerance):
+    """Bandingkan dua QgsRectangle per komponen dengan tolerance"""
+    return (
+        abs(bbox_a.xMinimum() - bbox_b.xMinimum()) <= tolerance and
+        abs(bbox_a.yMinimum() - bbox_b.yMinimum()) <= tolerance and
+        abs(bbox_a.xMaximum() - bbox_b.xMaximum()) <= tolerance and
+        abs(bbox_a.yMaximum() - bbox_b.yMaximum()) <= tolerance
+    )
+
+
+def geometry_from_wkb(wkb):
+    """Bangun QgsGeometry dari bytes WKB (None bila tidak ada geometri)"""
+    if wkb is None:
+        return None
+    geom = QgsGeometry()
+    geom.fromWkb(wkb)
+    return geom
+
+
+def compare_geometries(geom_old, geom_new):
+    """Deteksi perubahan geometri yang lebih akurat; mengembalikan (berubah, sama).
+
+    sama hanya True bila GEOS menyatakan kedua geometri sama; geometri invalid atau
+    null menghasilkan (False, False) sehingga tetap ikut analisis spasial.
+    Selisih luas untuk laporan diambil dari atribut 'luas', jadi area() tidak dihitung di sini.
+    """
+    if not geom_old.isGeosValid() or not geom_new.isGeosValid():
+        return False, False
+
+    # Bounding box dibandingkan dulu (murah); kesamaan topologis GEOS hanya dijalankan
+    # bila bounding box sama dalam batas tolerance. isGeosEqual (bukan equals() yang
+    # membandingkan urutan vertex) agar hasilnya sama dengan jalur shapely.equals
+    tolerance = 0.001
+    if bbox_close(geom_old.boundingBox(), geom_new.boundingBox(), tolerance):
+        geometri_sama = geom_old.isGeosEqual(geom_new)
+    else:
+        geometri_sama = False
+
+    return not geometri_sama, geometri_sama
+
+
+def compare_geometry_chunk(pairs):
+    """Bandingkan satu chunk (idsubsls, wkb_lama, wkb_baru) di thread worker.
+
+    Geometri dibangun ulang dari WKB di thread ini dan tidak ada widget Qt yang
+    disentuh; error dikembalikan sebagai pesan agar dicatat di thread utama.
+    """
+    results = []
+    for idsubsls, wkb_old, wkb_new in pairs:
+        if wkb_old is None or wkb_new is None:
+            results.append((idsubsls, False, False, None))
+            continue
+
+        # WKB identik byte-per-byte -> tidak ada perubahan, GEOS tidak perlu dipanggil
+        if wkb_old == wkb_new:
+            results.append((idsubsls, False, True, None))
+            continue
+
+        try:
+            geom_old = geometry_from_wkb(wkb_old)
+            geom_new = geometry_from_wkb(wkb_new)
+            results.append((idsubsls, *compare_geometries(geom_old, geom_new), None))
+        except Exception as e:
+            results.append((idsubsls, False, False, str(e)))
+    return results
+
+
+def shapely_compare_geometries(pairs):
+    """Versi vektor compare_geometry_chunk dengan shapely 2 untuk seluruh pasangan sekaligus.
+
+    Sama seperti compare_geometries: geometri invalid dianggap tidak berubah dan
+    kesamaan memakai equals topologis GEOS.
+    """
+    results = []
+    rows = []
+    for row, (idsubsls, wkb_old, wkb_new) in enumerate(pairs):
+        if wkb_old is None or wkb_new is None:
+            results.append((idsubsls, False, False, None))
+        else:
+            rows.append(row)
+    if not rows:
+        return results
+
+    geoms_old = shapely.from_wkb([pairs[row][1] for row in rows])
+    geoms_new = shapely.from_wkb([pairs[row][2] for row in rows])
+    valid = shapely.is_valid(geoms_old) & shapely.is_valid(geoms_new)
+    # equals hanya untuk pasangan valid; GEOS bisa raise pada polygon self-intersecting
+    # dan satu pasangan buruk tidak boleh menggagalkan seluruh batch
+    sama = np.zeros(len(rows), dtype=np.bool_)
+    sama[valid] = shapely.equals(geoms_old[valid], geoms_new[valid])
+    berubah = valid & ~sama
+    for row, changed, same in zip(rows, berubah.tolist(), sama.tolist()):
+        results.append((pairs[row][0], changed, same, None))
+    return results
+
+
+def shapely_difference(geoms_a, geoms_b):
+    """Kurangi setiap geoms_a[i] dengan union geoms_b yang bersinggungan (prefilter STRtree).
+
+    Kedua input berupa array numpy geometri shapely; operasi GEOS berjalan per batch.
+    """
+    result = geoms_a.copy()
+    tree = shapely.STRtree(geoms_b)
+    idx_a, idx_b = tree.query(geoms_a, predicate="intersects")
+    if len(idx_a) == 0:
+        return result
+
+    order = np.argsort(idx_a, kind="stable")
+    idx_a, idx_b = idx_a[order], idx_b[order]
+    targets, starts = np.unique(idx_a, return_index=True)
+    overlays = np.empty(len(targets), dtype=object)
+    for k, group in enumerate(np.split(idx_b, starts[1:])):
+        overlays[k] = shapely.union_all(geoms_b[group])
+
+    result[targets] = shapely.difference(geoms_a[targets], overlays)
+    return result
+
+
+def polygon_part(geom):
+    """Ambil bagian polygon dari hasil overlay sebagai MultiPolygon (None bila kosong)"""
+    geom = QgsGeometry(geom)
+    if geom.type() != QgsWkbTypes.PolygonGeometry:
+        geom.convertGeometryCollectionToSubclass(QgsWkbTypes.PolygonGeometry)
+    if geom.isNull() or geom.isEmpty() or geom.type() != QgsWkbTypes.PolygonGeometry:
+        return None
+    geom.convertToMultiType()
+    return geom
+
+
+def indexed_difference(input_layer, overlay_index, input_fids=None):
+    """Kurangi tiap fitur input dengan union fitur overlay yang bersinggungan.
+
+    overlay_index adalah QgsSpatialIndex dengan FlagStoreFeatureGeometries, sehingga
+    geometri kandidat diambil langsung dari index tanpa membaca provider lagi.
+    Kandidat (bbox) disaring dengan geometri input yang sudah di-prepare; fitur yang
+    seluruhnya berada di dalam satu fitur overlay dilewati tanpa difference.
+    Hanya fitur input_fids yang diproses (None = semua).
+    Mengembalikan list (atribut, QgsGeometry).
+    """
+    request = QgsFeatureRequest()
+    if input_fids is not None:
+        request.setFilterFids(list(input_fids))
+
+    results = []
+    for feat in input_layer.getFeatures(request):
+        geom = feat.geometry()
+        if geom.isNull() or geom.isEmpty():
+            continue
+
+        candidate_ids = overlay_index.intersects(geom.boundingBox())
+        engine = QgsGeometry.createGeometryEngine(geom.constGet())
+        engine.prepareGeometry()
+        overlaps = [
+            candidate for candidate in (overlay_index.geometry(fid) for fid in candidate_ids)
+            if engine.intersects(candidate.constGet())
+        ]
+
+        if any(engine.within(overlap.constGet()) for overlap in overlaps):
+            continue
+
+        diff = geom.difference(QgsGeometry.unaryUnion(overlaps)) if overlaps else geom
+        diff = polygon_part(diff)
+        if diff is not None:
+            results.append((feat.attributes(), diff))
+    return results
+
+
+def build_spatial_index(source):
+    """QgsSpatialIndex dengan geometri tersimpan dari layer atau QgsVectorLayerFeatureSource.
+
+    Dengan QgsVectorLayerFeatureSource (snapshot provider) fungsi ini aman
+    dijalankan di thread worker.
+    """
+    return QgsSpatialIndex(
+        source.getFeatures(QgsFeatureRequest().setSubsetOfAttributes([])),
+        flags=QgsSpatialIndex.FlagStoreFeatureGeometries
+    )
+
+
+def crs_differs(crs_a, crs_b):
+    """authid cukup dibandingkan sebagai string; CRS custom (tanpa authid) dibandingkan penuh"""
+    return crs_a.authid() != crs_b.authid() or (not crs_a.authid() and crs_a != crs_b)
+
+
+def geometry_digests(source, fids):
+    """Digest blake2b 8 byte dari WKB geometri per fid (tanpa atribut).
+
+    Digest yang sama berarti WKB identik, sehingga pasangan tersebut tidak perlu
+    WKB lengkap maupun GEOS; WKB tiap fitur langsung di-hash lalu dibuang.
+    Dengan QgsVectorLayerFeatureSource fungsi ini aman dijalankan di thread worker.
+    """
+    request = QgsFeatureRequest().setFilterFids(list(fids))
+    request.setSubsetOfAttributes([])
+    return {
+        feat.id(): hashlib.blake2b(bytes(feat.geometry().asWkb()), digest_size=8).digest()
+        for feat in source.getFeatures(request)
+    }
+
+
+def reproject_layer(layer, crs):
+    """Salin layer ke memory layer dalam crs via QgsFeatureRequest.setDestinationCrs"""
+    request = QgsFeatureRequest().setDestinationCrs(crs, QgsProject.instance().transformContext())
+    features = list(layer.getFeatures(request))
+
+    reprojected = QgsVectorLayer(QgsWkbTypes.displayString(layer.wkbType()), layer.name(), "memory")
+    reprojected.setCrs(crs)
+    provider = reprojected.dataProvider()
+    provider.addAttributes(layer.fields().toList())
+    reprojected.updateFields()
+    provider.addFeatures(features)
+    reprojected.updateExtents()
+    return reprojected
+
+
+def create_memory_layer(name, crs, fields, features):
+    """Buat memory layer MultiPolygon dari list (atribut, QgsGeometry)"""
+    layer = QgsVectorLayer("MultiPolygon", name, "memory")
+    layer.setCrs(crs)
+    provider = layer.dataProvider()
+    provider.addAttributes(fields.toList())
+    layer.updateFields()
+
+    layer_fields = layer.fields()
+    qgs_features = [None] * len(features)
+    for i, (attributes, geom) in enumerate(features):
+        feat = QgsFeature(layer_fields)
+        feat.setGeometry(geom)
+        feat.setAttributes(attributes)
+        qgs_features[i] = feat
+
+    # FastInsert: id fitur baru tidak perlu dikembalikan ke Python
+    provider.addFeatures(qgs_features, QgsFeatureSink.FastInsert)
+    layer.updateExtents()
+    return layer
+
+
+class ChangeRecord(NamedTuple):
+    """Satu baris laporan perubahan (by_id atau spatial), tanpa __dict__ per baris"""
+    idsubsls: object
+    status: str
+    batas_berubah: bool
+    luas_lama: float
+    luas_baru: float
+    selisih_luas: float
+    kdsubsls_lama: object
+    kdsubsls_baru: object
+    kdsubsls_changed: bool
+    type: str
+    wkb: bytes = None  # WKB geometri untuk export (None bila tidak ada)
+    area: float = 0.0  # luas polygon perubahan spasial
+
+
+class ChangesTableModel(QAbstractTableModel):
+    """Model tabel perubahan yang membaca langsung dari list changes_by_id (tanpa salinan)"""
+
+    HEADERS = [
+        "idsubsls", "Status", "Perubahan Batas SLS", "Luas Lama", "Luas Baru", "Selisih Luas", "kdsubsls Berubah"
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._display = []  # cache string per baris, diisi saat baris pertama kali ditampilkan
+
+    def set_changes(self, changes):
+        self.beginResetModel()
+        self._rows = changes
+        self._display = [None] * len(changes)
+        self.endResetModel()
+
+    @staticmethod
+    def format_row(change):
+        return (
+            str(change.idsubsls),
+            change.status,
+            "✅ Ya" if change.batas_berubah else "❌ Tidak",
+            f"{change.luas_lama:.4f}",
+            f"{change.luas_baru:.4f}",
+            f"{change.selisih_luas:+.4f}",
+            "✅ Ya" if change.kdsubsls_changed else "❌ Tidak",
+        )
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        # Semua kolom satu baris diformat sekali, repaint berikutnya hanya indexing
+        row = index.row()
+        display = self._display[row]
+        if display is None:
+            display = self._display[row] = self.format_row(self._rows[row])
+        return display[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
 
 
 class SLSChangeDetectorDialog(QDialog):
@@ -32,7 +355,10 @@ class SLSChangeDetectorDialog(QDialog):
         self.changes_by_id = []
         self.spatial_changes = []
         self.combined_report = []
-        self.duplicate_ids_new = []  # Duplikat berdasarkan idsubsls
+        self.duplicate_ids_new = set()  # Duplikat berdasarkan idsubsls (set: cek anggota O(1) saat export)
+        self.spatial_index_cache = {}  # (source, mtime, status -wal) -> QgsSpatialIndex
+        self.index_warnings = []  # peringatan RTree yang ditampilkan di ringkasan akhir
+        self.spatial_index_futures = {}  # (source, mtime, status -wal) -> Future QgsSpatialIndex yang sedang dibangun
 
         layout = QVBoxLayout(self)
 
@@ -83,11 +409,9 @@ class SLSChangeDetectorDialog(QDialog):
 
         # Tab 2: Changed Features (by idsubsls)
         table_layout = QVBoxLayout()
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels([
-            "idsubsls", "Status", "Perubahan Batas SLS", "Luas Lama", "Luas Baru", "Selisih Luas", "kdsubsls Berubah"
-        ])
+        self.table = QTableView()
+        self.table_model = ChangesTableModel(self)
+        self.table.setModel(self.table_model)
         self.table.horizontalHeader().setStretchLastSection(True)
         table_layout.addWidget(self.table)
 
@@ -165,36 +489,122 @@ class SLSChangeDetectorDialog(QDialog):
         
         return errors
 
-    def detect_geometry_changes(self, old_feat, new_feat):
-        """Deteksi perubahan geometri yang lebih akurat"""
-        try:
-            geom_old = old_feat.geometry()
-            geom_new = new_feat.geometry()
-            
-            if not geom_old.isGeosValid() or not geom_new.isGeosValid():
-                return False, 0.0
-            
-            # Gunakan tolerance untuk perbandingan
-            tolerance = 0.001
-            geometri_sama = geom_old.equals(geom_new, tolerance)
-            
-            # Hitung selisih luas dengan handling error
+    def ensure_spatial_index(self, layer, label):
+        """Cek RTree GeoPackage; tawarkan untuk membuatnya bila belum ada"""
+        if layer.hasSpatialIndex() == QgsFeatureSource.SpatialIndexPresent:
+            return
+
+        warning = f"⚠️ File {label} tidak memiliki spatial index (RTree) — analisis spasial akan lambat."
+        self.log_detection_info(warning)
+        # Disimpan juga agar tetap tampil setelah ringkasan menimpa summary_text
+        self.index_warnings.append(warning)
+        answer = QMessageBox.question(
+            self, "Spatial Index",
+            f"File {label} belum memiliki spatial index (RTree).\n"
+            "Buat sekarang? File GeoPackage akan dimodifikasi.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if answer != QMessageBox.Yes:
+            return
+
+        if layer.dataProvider().createSpatialIndex():
+            self.log_detection_info(f"Spatial index file {label} berhasil dibuat.")
+        else:
+            self.log_detection_info(f"Gagal membuat spatial index file {label}.")
+
+    def load_attributes(self, layer):
+        """Ambil idsubsls -> (fid, luas, kdsubsls) tanpa membaca geometri"""
+        fields = layer.fields()
+        # Index field dihitung sekali, di dalam loop atribut diakses per index
+        fi_id = fields.indexOf("idsubsls")
+        fi_luas = fields.indexOf("luas")
+        fi_kd = fields.indexOf("kdsubsls")
+        has_kdsubsls = fi_kd >= 0
+        attr_idx = [fi_id, fi_luas] + ([fi_kd] if has_kdsubsls else [])
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(attr_idx)
+
+        features = {}
+        # Loop dipisah per ada/tidaknya kdsubsls agar tidak ada cabang per fitur
+        if has_kdsubsls:
+            for feat in layer.getFeatures(request):
+                attrs = feat.attributes()
+                luas = attrs[fi_luas]
+                idsubsls = attrs[fi_id]
+                if type(idsubsls) is str:
+                    # idsubsls yang sama di kedua layer menjadi objek yang sama,
+                    # lookup dict antar layer cukup perbandingan identitas
+                    idsubsls = sys.intern(idsubsls)
+                features[idsubsls] = (feat.id(), float(luas) if luas is not None else 0.0, attrs[fi_kd])
+        else:
+            for feat in layer.getFeatures(request):
+                attrs = feat.attributes()
+                luas = attrs[fi_luas]
+                idsubsls = attrs[fi_id]
+                if type(idsubsls) is str:
+                    idsubsls = sys.intern(idsubsls)
+                features[idsubsls] = (feat.id(), float(luas) if luas is not None else 0.0, None)
+        return features
+
+    def load_geometries(self, layer, fids):
+        """Ambil WKB geometri (tanpa atribut) untuk sekumpulan fid dalam satu request.
+
+        Disimpan sebagai bytes agar perbandingan "berubah atau tidak" cukup memcmp;
+        QgsGeometry hanya dibangun untuk fitur yang masuk laporan.
+        """
+        request = QgsFeatureRequest().setFilterFids(list(fids))
+        request.setSubsetOfAttributes([])
+        return {feat.id(): bytes(feat.geometry().asWkb()) for feat in layer.getFeatures(request)}
+
+    def compare_attributes(self, ids, old_features, new_features):
+        """Bandingkan luas dan kdsubsls secara vektor untuk daftar idsubsls.
+
+        luas dibandingkan sebagai fixed-point int64 (toleransi 0.001 = 10 unit) dan
+        kdsubsls dikodekan ke int32, lalu keduanya dibandingkan di kernel
+        _diff_kernel (numba bila tersedia, selain itu NumPy).
+        Mengembalikan (luas_berubah, kdsubsls_berubah) berupa array bool sejajar dengan ids.
+        """
+        n = len(ids)
+        luas_old = quantize_luas(np.fromiter((old_features[i][1] for i in ids), dtype=np.float64, count=n))
+        luas_new = quantize_luas(np.fromiter((new_features[i][1] for i in ids), dtype=np.float64, count=n))
+        kd_old_codes, kd_new_codes = factorize_pair(
+            [old_features[i][2] for i in ids], [new_features[i][2] for i in ids]
+        )
+
+        return diff_masks(luas_old, luas_new, kd_old_codes, kd_new_codes, round(0.001 * LUAS_SCALE))
+
+    def detect_geometry_changes(self, pairs):
+        """Deteksi perubahan geometri untuk list (idsubsls, wkb_lama, wkb_baru).
+
+        Dengan shapely 2 semua pasangan dibandingkan vektor dalam satu panggilan GEOS;
+        selain itu pasangan dibagi per chunk dan dibandingkan paralel di
+        ThreadPoolExecutor (GEOS melepas GIL).
+        Mengembalikan dict idsubsls -> (berubah, sama); sama hanya True bila kesamaan
+        geometri terbukti (WKB identik atau equals GEOS).
+        """
+        chunk_results = None
+        if HAS_SHAPELY and pairs:
             try:
-                luas_old = geom_old.area() if geom_old else 0.0
-                luas_new = geom_new.area() if geom_new else 0.0
-                selisih_luas = abs(luas_old - luas_new)
-            except:
-                selisih_luas = 0.0
-            
-            # Threshold perubahan (bisa disesuaikan)
-            threshold_luas = 1.0  # 1 meter persegi
-            perubahan_signifikan = selisih_luas > threshold_luas
-            
-            return not geometri_sama or perubahan_signifikan, selisih_luas
-            
-        except Exception as e:
-            self.log_detection_info(f"Error deteksi geometri: {str(e)}")
-            return False, 0.0
+                chunk_results = [shapely_compare_geometries(pairs)]
+            except Exception as e:
+                self.log_detection_info(f"Perbandingan geometri shapely gagal, memakai QgsGeometry: {str(e)}")
+
+        if chunk_results is None:
+            chunks = [pairs[i:i + GEOMETRY_CHUNK_SIZE] for i in range(0, len(pairs), GEOMETRY_CHUNK_SIZE)]
+            if len(chunks) > 1:
+                with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                    chunk_results = list(executor.map(compare_geometry_chunk, chunks))
+            else:
+                chunk_results = [compare_geometry_chunk(chunk) for chunk in chunks]
+
+        # Log error di thread utama karena menyentuh widget
+        results = {}
+        for chunk_result in chunk_results:
+            for idsubsls, berubah, sama, error in chunk_result:
+                if error:
+                    self.log_detection_info(f"Error deteksi geometri: {error}")
+                results[idsubsls] = (berubah, sama)
+        return results
 
     def run_detection(self):
         old_path = self.old_line.text().strip()
@@ -232,6 +642,11 @@ class SLSChangeDetectorDialog(QDialog):
             self.progress.setVisible(False)
             return
 
+        # Pastikan RTree GeoPackage tersedia agar predikat spasial tidak full table scan
+        self.index_warnings = []
+        self.ensure_spatial_index(old_layer, "lama")
+        self.ensure_spatial_index(new_layer, "baru")
+
         # Cek field yang dibutuhkan
         required_fields = ["idsubsls", "luas"]
         for field in required_fields:
@@ -240,156 +655,225 @@ class SLSChangeDetectorDialog(QDialog):
                 self.progress.setVisible(False)
                 return
 
-        # ================================
-        # 0. VALIDASI: CEK DUPLIKAT DI FILE BARU (berdasarkan gid + kdsubsls = NULL)
-        # ================================
-        self.progress.setValue(30)
-        self.duplicate_ids_new = []
-        if "gid" in [f.name() for f in new_layer.fields()] and "kdsubsls" in [f.name() for f in new_layer.fields()]:
-            gid_groups = {}
-            for feat in new_layer.getFeatures():
-                gid = feat["gid"]
-                kdsubsls = feat["kdsubsls"]
-                idsubsls = feat["idsubsls"]
-
-                if gid not in gid_groups:
-                    gid_groups[gid] = []
-                gid_groups[gid].append({"idsubsls": idsubsls, "kdsubsls": kdsubsls})
-
-            for gid, features in gid_groups.items():
-                if len(features) > 1:
-                    has_null = any(f["kdsubsls"] is None or str(f["kdsubsls"]).strip() == "" for f in features)
-                    if has_null:
-                        for f in features:
-                            self.duplicate_ids_new.append(f["idsubsls"])
-
-            if self.duplicate_ids_new:
-                self.summary_text.append(
-                    f"\n⚠️ VALIDASI: Ditemukan {len(self.duplicate_ids_new)} idsubsls duplikat di file BARU.\n"
-                    "Kriteria: gid sama + ada kdsubsls = NULL → dianggap belum lengkap.\n"
-                    f"Contoh: {', '.join(self.duplicate_ids_new[:5])}"
-                )
-        else:
-            self.summary_text.append("\nℹ️ Field 'gid' atau 'kdsubsls' tidak ditemukan di file baru — lewati validasi duplikat.")
-
-        # ================================
-        # 1. ANALISIS BERDASARKAN idsubsls
-        # ================================
-        self.progress.setValue(40)
-        self.changes_by_id = []
-        old_features = {}
-        for feat in old_layer.getFeatures():
-            idsubsls = feat["idsubsls"]
-            old_features[idsubsls] = {
-                "geom": feat.geometry(),
-                "luas": float(feat["luas"]) if feat["luas"] is not None else 0.0,
-                "kdsubsls": feat["kdsubsls"] if "kdsubsls" in feat.fields().names() else None,
-                "feature": feat  # Simpan feature lengkap untuk analisis geometri
-            }
+        # Spatial index untuk overlay (fallback tanpa shapely) dibangun di thread worker
+        # bersamaan dengan deteksi by idsubsls, lalu ditunggu sebelum analisis spasial
+        index_executor = None
+        if not HAS_SHAPELY:
+            index_executor = ThreadPoolExecutor(max_workers=2)
+            self.prefetch_spatial_index(old_layer, index_executor)
+            # Bila CRS berbeda, analisis spasial memakai layer baru hasil reproject
+            if not crs_differs(old_layer.crs(), new_layer.crs()):
+                self.prefetch_spatial_index(new_layer, index_executor)
 
-        new_features = {}
-        for feat in new_layer.getFeatures():
-            idsubsls = feat["idsubsls"]
-            new_features[idsubsls] = {
-                "geom": feat.geometry(),
-                "luas": float(feat["luas"]) if feat["luas"] is not None else 0.0,
-                "kdsubsls": feat["kdsubsls"] if "kdsubsls" in feat.fields().names() else None,
-                "feature": feat  # Simpan feature lengkap untuk analisis geometri
-            }
+        try:
+            # ================================
+            # 0. VALIDASI: CEK DUPLIKAT DI FILE BARU (berdasarkan gid + kdsubsls = NULL)
+            # ================================
+            self.progress.setValue(30)
+            self.duplicate_ids_new = set()
+            new_fields = new_layer.fields()
+            fi_gid = new_fields.indexOf("gid")
+            fi_kd = new_fields.indexOf("kdsubsls")
+            if fi_gid >= 0 and fi_kd >= 0:
+                fi_id = new_fields.indexOf("idsubsls")
+                request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+                request.setSubsetOfAttributes([fi_gid, fi_id, fi_kd])
+
+                gid_groups = defaultdict(list)
+                for feat in new_layer.getFeatures(request):
+                    attrs = feat.attributes()
+                    gid_groups[attrs[fi_gid]].append((attrs[fi_id], attrs[fi_kd]))
+
+                self.duplicate_ids_new = {
+                    idsubsls
+                    for features in gid_groups.values()
+                    if len(features) > 1 and any(
+                        kdsubsls is None or str(kdsubsls).strip() == "" for _, kdsubsls in features
+                    )
+                    for idsubsls, _ in features
+                }
+
+                if self.duplicate_ids_new:
+                    self.summary_text.append(
+                        f"\n⚠️ VALIDASI: Ditemukan {len(self.duplicate_ids_new)} idsubsls duplikat di file BARU.\n"
+                        "Kriteria: gid sama + ada kdsubsls = NULL → dianggap belum lengkap.\n"
+                        f"Contoh: {', '.join(list(self.duplicate_ids_new)[:5])}"
+                    )
+            else:
+                self.summary_text.append("\nℹ️ Field 'gid' atau 'kdsubsls' tidak ditemukan di file baru — lewati validasi duplikat.")
+
+            # ================================
+            # 1. ANALISIS BERDASARKAN idsubsls
+            # ================================
+            self.progress.setValue(40)
+            self.changes_by_id = []
+            # Pass atribut saja (tanpa geometri) untuk membangun dict idsubsls
+            old_features = self.load_attributes(old_layer)
+            new_features = self.load_attributes(new_layer)
+
+            common_ids = list(old_features.keys() & new_features.keys())
+            added_ids = new_features.keys() - old_features.keys()
+            removed_ids = old_features.keys() - new_features.keys()
+
+            total_old = len(old_features)
+            total_new = len(new_features)
+            ditambahkan = 0
+            dihapus = 0
+
+            # Fitur yang ada di kedua file
+            self.progress.setValue(50)
+            # Pass kedua: digest WKB untuk semua pasangan idsubsls, satu worker per layer
+            # (snapshot QgsVectorLayerFeatureSource); WKB tidak dikumpulkan, hanya digest
+            with ThreadPoolExecutor(max_workers=2) as digest_executor:
+                old_digests_future = digest_executor.submit(
+                    geometry_digests, QgsVectorLayerFeatureSource(old_layer),
+                    [old_features[i][0] for i in common_ids]
+                )
+                new_digests_future = digest_executor.submit(
+                    geometry_digests, QgsVectorLayerFeatureSource(new_layer),
+                    [new_features[i][0] for i in common_ids]
+                )
+                # Bandingkan luas dan kdsubsls dari atribut selagi digest dihitung
+                luas_changed_mask, kdsubsls_changed_mask = self.compare_attributes(
+                    common_ids, old_features, new_features
+                )
+                old_digests = old_digests_future.result()
+                new_digests = new_digests_future.result()
+
+            # Hanya pasangan dengan digest berbeda yang perlu WKB lengkap dan GEOS;
+            # pasangan yang salah satu geometrinya tidak ada dianggap tidak berubah
+            differing_ids = []
+            paired_ids = []
+            for idsubsls in common_ids:
+                old_digest = old_digests.get(old_features[idsubsls][0])
+                new_digest = new_digests.get(new_features[idsubsls][0])
+                if old_digest is None or new_digest is None:
+                    continue
+                if old_digest != new_digest:
+                    differing_ids.append(idsubsls)
+                else:
+                    paired_ids.append(idsubsls)
+            del old_digests, new_digests
+
+            # Pass ketiga: WKB hanya untuk pasangan yang berbeda, baris dengan atribut
+            # berubah (untuk export) dan fitur yang ditambahkan
+            attr_changed_ids = [common_ids[k] for k in np.flatnonzero(luas_changed_mask | kdsubsls_changed_mask).tolist()]
+            old_geoms = self.load_geometries(old_layer, (old_features[i][0] for i in differing_ids))
+            new_geoms = self.load_geometries(
+                new_layer,
+                {new_features[i][0] for i in [*differing_ids, *attr_changed_ids, *added_ids]}
+            )
 
-        total_old = len(old_features)
-        total_new = len(new_features)
-        batas_berubah = 0
-        kdsubsls_berubah = 0
-        ditambahkan = 0
-        dihapus = 0
-
-        # Fitur yang ada di kedua file
-        self.progress.setValue(50)
-        for idsubsls in set(old_features.keys()) & set(new_features.keys()):
-            old_feat = old_features[idsubsls]
-            new_feat = new_features[idsubsls]
-
-            # Deteksi perubahan geometri yang lebih akurat
-            batas_sls_berubah, selisih_luas_geom = self.detect_geometry_changes(
-                old_feat["feature"], new_feat["feature"]
+            geometry_results = self.detect_geometry_changes([
+                (idsubsls,
+                 old_geoms.get(old_features[idsubsls][0]),
+                 new_geoms.get(new_features[idsubsls][0]))
+                for idsubsls in differing_ids
+            ])
+            no_change = (False, False)
+            batas_mask = np.fromiter(
+                (geometry_results.get(idsubsls, no_change)[0] for idsubsls in common_ids),
+                dtype=np.bool_, count=len(common_ids)
             )
-            
-            # Juga bandingkan luas dari atribut
-            selisih_luas_attr = old_feat["luas"] - new_feat["luas"]
-            kdsubsls_changed = old_feat["kdsubsls"] != new_feat["kdsubsls"]
-
-            if batas_sls_berubah or kdsubsls_changed or abs(selisih_luas_attr) > 0.001:
-                status = "DIUBAH"
-                if batas_sls_berubah:
-                    batas_berubah += 1
-                if kdsubsls_changed:
-                    kdsubsls_berubah += 1
-
-                self.changes_by_id.append({
-                    "idsubsls": idsubsls,
-                    "status": status,
-                    "batas_berubah": batas_sls_berubah,
-                    "luas_lama": old_feat["luas"],
-                    "luas_baru": new_feat["luas"],
-                    "selisih_luas": selisih_luas_attr,
-                    "kdsubsls_lama": old_feat["kdsubsls"],
-                    "kdsubsls_baru": new_feat["kdsubsls"],
-                    "kdsubsls_changed": kdsubsls_changed,
-                    "type": "by_id",
-                    "geom": new_feat["geom"]  # Simpan geometri untuk export
-                })
-
-        # Fitur ditambahkan (ada di baru, tidak di lama)
-        self.progress.setValue(60)
-        for idsubsls in set(new_features.keys()) - set(old_features.keys()):
-            new_feat = new_features[idsubsls]
-            ditambahkan += 1
-            self.changes_by_id.append({
-                "idsubsls": idsubsls,
-                "status": "DITAMBAHKAN",
-                "batas_berubah": False,
-                "luas_lama": 0.0,
-                "luas_baru": new_feat["luas"],
-                "selisih_luas": -new_feat["luas"],
-                "kdsubsls_lama": None,
-                "kdsubsls_baru": new_feat["kdsubsls"],
-                "kdsubsls_changed": False,
-                "type": "by_id",
-                "geom": new_feat["geom"]
-            })
 
-        # Fitur dihapus (ada di lama, tidak di baru)
-        for idsubsls in set(old_features.keys()) - set(new_features.keys()):
-            old_feat = old_features[idsubsls]
-            dihapus += 1
-            self.changes_by_id.append({
-                "idsubsls": idsubsls,
-                "status": "DIHAPUS",
-                "batas_berubah": False,
-                "luas_lama": old_feat["luas"],
-                "luas_baru": 0.0,
-                "selisih_luas": old_feat["luas"],
-                "kdsubsls_lama": old_feat["kdsubsls"],
-                "kdsubsls_baru": None,
-                "kdsubsls_changed": False,
-                "type": "by_id",
-                "geom": None
-            })
+            # Klasifikasi semua baris sekaligus; record laporan hanya dibuat untuk baris yang berubah
+            changed_mask = batas_mask | luas_changed_mask | kdsubsls_changed_mask
+            batas_berubah = int(np.count_nonzero(batas_mask))
+            kdsubsls_berubah = int(np.count_nonzero(kdsubsls_changed_mask))
+
+            # (fid lama, fid baru) dengan geometri terbukti sama: digest sama, atau digest
+            # berbeda tetapi GEOS menyatakan geometri sama. Pasangan invalid/null/error
+            # tidak "berubah" di laporan by idsubsls tetapi tetap ikut overlay
+            unchanged_pairs = [
+                (old_features[idsubsls][0], new_features[idsubsls][0])
+                for idsubsls in paired_ids
+            ]
+            unchanged_pairs.extend(
+                (old_features[idsubsls][0], new_features[idsubsls][0])
+                for idsubsls in differing_ids
+                if geometry_results[idsubsls][1]
+            )
+            del paired_ids, differing_ids, attr_changed_ids
+
+            for k in np.flatnonzero(changed_mask).tolist():
+                idsubsls = common_ids[k]
+                old_fid, old_luas, old_kdsubsls = old_features[idsubsls]
+                new_fid, new_luas, new_kdsubsls = new_features[idsubsls]
+
+                self.changes_by_id.append(ChangeRecord(
+                    idsubsls=idsubsls,
+                    status="DIUBAH",
+                    batas_berubah=bool(batas_mask[k]),
+                    luas_lama=old_luas,
+                    luas_baru=new_luas,
+                    selisih_luas=old_luas - new_luas,
+                    kdsubsls_lama=old_kdsubsls,
+                    kdsubsls_baru=new_kdsubsls,
+                    kdsubsls_changed=bool(kdsubsls_changed_mask[k]),
+                    type="by_id",
+                    wkb=new_geoms.get(new_fid)  # Simpan WKB geometri untuk export
+                ))
+
+            # Fitur ditambahkan (ada di baru, tidak di lama)
+            self.progress.setValue(60)
+            for idsubsls in added_ids:
+                new_fid, new_luas, new_kdsubsls = new_features[idsubsls]
+                ditambahkan += 1
+                self.changes_by_id.append(ChangeRecord(
+                    idsubsls=idsubsls,
+                    status="DITAMBAHKAN",
+                    batas_berubah=False,
+                    luas_lama=0.0,
+                    luas_baru=new_luas,
+                    selisih_luas=-new_luas,
+                    kdsubsls_lama=None,
+                    kdsubsls_baru=new_kdsubsls,
+                    kdsubsls_changed=False,
+                    type="by_id",
+                    wkb=new_geoms.get(new_fid)
+                ))
+
+            # Fitur dihapus (ada di lama, tidak di baru)
+            for idsubsls in removed_ids:
+                old_fid, old_luas, old_kdsubsls = old_features[idsubsls]
+                dihapus += 1
+                self.changes_by_id.append(ChangeRecord(
+                    idsubsls=idsubsls,
+                    status="DIHAPUS",
+                    batas_berubah=False,
+                    luas_lama=old_luas,
+                    luas_baru=0.0,
+                    selisih_luas=old_luas,
+                    kdsubsls_lama=old_kdsubsls,
+                    kdsubsls_baru=None,
+                    kdsubsls_changed=False,
+                    type="by_id",
+                    wkb=None
+                ))
+
+            # Dict per idsubsls dan WKB yang tidak masuk laporan tidak dibutuhkan lagi;
+            # lepaskan sebelum analisis spasial yang membuat memory layer besar
+            del old_features, new_features, old_geoms, new_geoms, geometry_results
+
+            # Tunggu index hasil prefetch sebelum analisis spasial
+            if index_executor is not None:
+                self.collect_spatial_index_prefetch()
+        finally:
+            # Worker selalu dihentikan, juga bila deteksi by idsubsls gagal
+            if index_executor is not None:
+                index_executor.shutdown()
 
         # ================================
         # 2. ANALISIS SPASIAL
         # ================================
         self.progress.setValue(70)
-        self.run_spatial_analysis(old_layer, new_layer)
+        self.run_spatial_analysis(old_layer, new_layer, unchanged_pairs)
 
         # ================================
         # 3. GABUNGKAN HASIL
         # ================================
         self.progress.setValue(80)
-        self.combined_report = self.changes_by_id.copy()
-        for sc in self.spatial_changes:
-            self.combined_report.append(sc)
+        self.combined_report = self.changes_by_id + self.spatial_changes
 
         # Tampilkan ringkasan
         summary = f"""
@@ -413,18 +897,12 @@ Perubahan terdeteksi:
 ⏰ Waktu analisis: {time.strftime('%Y-%m-%d %H:%M:%S')}
         """
         self.summary_text.setText(summary)
+        for warning in self.index_warnings:
+            self.summary_text.append(warning)
 
         # Tampilkan tabel
         self.progress.setValue(90)
-        self.table.setRowCount(len(self.changes_by_id))
-        for row, change in enumerate(self.changes_by_id):
-            self.table.setItem(row, 0, QTableWidgetItem(str(change["idsubsls"])))
-            self.table.setItem(row, 1, QTableWidgetItem(change["status"]))
-            self.table.setItem(row, 2, QTableWidgetItem("✅ Ya" if change["batas_berubah"] else "❌ Tidak"))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{change['luas_lama']:.4f}"))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{change['luas_baru']:.4f}"))
-            self.table.setItem(row, 5, QTableWidgetItem(f"{change['selisih_luas']:+.4f}"))
-            self.table.setItem(row, 6, QTableWidgetItem("✅ Ya" if change["kdsubsls_changed"] else "❌ Tidak"))
+        self.table_model.set_changes(self.changes_by_id)
 
         self.export_csv_btn.setEnabled(len(self.combined_report) > 0)
         self.export_gpkg_btn.setEnabled(len(self.combined_report) > 0)
@@ -435,40 +913,93 @@ Perubahan terdeteksi:
         # Hide progress after completion
         QTimer.singleShot(1000, lambda: self.progress.setVisible(False))
 
-    def run_spatial_analysis(self, old_layer, new_layer):
-        """Deteksi perubahan batas berdasarkan geometri"""
-        try:
-            from qgis import processing
-        except ImportError:
-            self.summary_text.append("❌ Modul 'processing' tidak tersedia.")
+    @staticmethod
+    def spatial_index_key(layer):
+        """Kunci cache spatial index (source, mtime, status -wal); None bila bukan file OGR.
+
+        GeoPackage dibuka QGIS dalam mode WAL: edit bisa masuk ke <file>-wal tanpa
+        mengubah mtime file utama, jadi mtime dan ukuran -wal ikut menjadi kunci.
+        """
+        if layer.providerType() == "ogr":
+            path = layer.source().split("|")[0]
+            if os.path.exists(path):
+                wal_path = path + "-wal"
+                wal = None
+                if os.path.exists(wal_path):
+                    wal_stat = os.stat(wal_path)
+                    wal = (wal_stat.st_mtime, wal_stat.st_size)
+                return (layer.source(), os.path.getmtime(path), wal)
+        return None
+
+    def prefetch_spatial_index(self, layer, executor):
+        """Mulai bangun spatial index di thread worker selagi deteksi by idsubsls berjalan"""
+        key = self.spatial_index_key(layer)
+        if key is None or key in self.spatial_index_cache or key in self.spatial_index_futures:
             return
+        # QgsVectorLayer tidak thread-safe; worker hanya membaca snapshot provider
+        source = QgsVectorLayerFeatureSource(layer)
+        self.spatial_index_futures[key] = executor.submit(build_spatial_index, source)
+
+    def store_spatial_index(self, key, index):
+        self.spatial_index_cache[key] = index
+        # Cukup simpan index untuk pasangan file terakhir
+        while len(self.spatial_index_cache) > 2:
+            self.spatial_index_cache.pop(next(iter(self.spatial_index_cache)))
+
+    def collect_spatial_index_prefetch(self):
+        """Tunggu index yang di-prefetch dan simpan ke cache (dipanggil di thread utama)"""
+        for key, future in list(self.spatial_index_futures.items()):
+            try:
+                self.store_spatial_index(key, future.result())
+            except Exception as e:
+                self.log_detection_info(f"Gagal membangun spatial index: {str(e)}")
+        self.spatial_index_futures.clear()
+
+    def get_spatial_index(self, layer):
+        """QgsSpatialIndex dengan geometri tersimpan, di-cache per file selama dialog terbuka.
 
-        if old_layer.crs() != new_layer.crs():
+        Deteksi ulang pada file yang sama (dan belum diubah) memakai index yang sudah ada.
+        """
+        key = self.spatial_index_key(layer)
+        if key is not None and key in self.spatial_index_futures:
+            self.collect_spatial_index_prefetch()
+        if key is not None and key in self.spatial_index_cache:
+            return self.spatial_index_cache[key]
+
+        index = build_spatial_index(layer)
+        if key is not None:
+            self.store_spatial_index(key, index)
+        return index
+
+    def run_spatial_analysis(self, old_layer, new_layer, unchanged_pairs=None):
+        """Deteksi perubahan batas berdasarkan geometri"""
+        if crs_differs(old_layer.crs(), new_layer.crs()):
             self.log_detection_info("CRS berbeda — reproject layer baru...")
-            params = {
-                'INPUT': new_layer,
-                'TARGET_CRS': old_layer.crs(),
-                'OUTPUT': 'memory:'
-            }
-            new_layer = processing.run("native:reprojectlayer", params)['OUTPUT']
+            new_layer = reproject_layer(new_layer, old_layer.crs())
+            # WKB "sama" diukur di CRS masing-masing layer, jadi di CRS berbeda posisinya
+            # tidak sama; overlay harus memakai semua fitur
+            unchanged_pairs = None
+
+        # Fitur yang sama persis dengan pasangannya (idsubsls sama) tidak menghasilkan
+        # polygon difference, jadi hanya fitur yang berubah yang menjadi input overlay
+        old_fids = new_fids = None
+        if unchanged_pairs is not None:
+            old_fids = set(old_layer.allFeatureIds()) - {old_fid for old_fid, _ in unchanged_pairs}
+            new_fids = set(new_layer.allFeatureIds()) - {new_fid for _, new_fid in unchanged_pairs}
+            self.log_detection_info(
+                f"Overlay dibatasi ke {len(old_fids)} fitur lama dan {len(new_fids)} fitur baru yang berubah."
+            )
+            if not old_fids and not new_fids:
+                self.log_detection_info("Tidak ada perubahan batas spasial terdeteksi.")
+                self.spatial_changes = []
+                return
 
         # Enhanced spatial analysis dengan multiple methods
-        spatial_results = self.enhanced_spatial_analysis(old_layer, new_layer)
+        spatial_results = self.enhanced_spatial_analysis(old_layer, new_layer, old_fids, new_fids)
         
         if spatial_results.get('symmetrical'):
             diff_layer = spatial_results['symmetrical']
-            
-            join_params = {
-                'INPUT': diff_layer,
-                'JOIN': new_layer,
-                'PREDICATE': [0],
-                'JOIN_FIELDS': ['idsubsls'],
-                'METHOD': 0,
-                'DISCARD_NONMATCHING': False,
-                'OUTPUT': 'memory:'
-            }
-            diff_joined = processing.run("native:joinattributesbylocation", join_params)['OUTPUT']
-            diff_joined.setName("SLS_Perubahan_Batas_Spasial")
+            diff_layer.setName("SLS_Perubahan_Batas_Spasial")
 
             symbol = QgsFillSymbol.createSimple({
                 'color': '255,0,0,100',
@@ -476,103 +1007,145 @@ Perubahan terdeteksi:
                 'outline_width': '0.5'
             })
             renderer = QgsSingleSymbolRenderer(symbol)
-            diff_joined.setRenderer(renderer)
-            QgsProject.instance().addMapLayer(diff_joined)
+            diff_layer.setRenderer(renderer)
+            QgsProject.instance().addMapLayer(diff_layer)
 
+            # idsubsls sudah dibawa langsung dari fitur input, tidak perlu spatial join
             self.spatial_changes = []
-            for feat in diff_joined.getFeatures():
+            append_change = self.spatial_changes.append
+            total_area = 0.0
+            fi_id = diff_layer.fields().indexOf("idsubsls")
+            request = QgsFeatureRequest().setSubsetOfAttributes([fi_id])
+            for feat in diff_layer.getFeatures(request):
                 geom = feat.geometry()
                 if geom:
                     area = geom.area()
-                    idsubsls = feat["idsubsls"] if feat.fieldNameIndex("idsubsls") >= 0 else "SPASIAL_" + str(feat.id())
-                    self.spatial_changes.append({
-                        "idsubsls": idsubsls,
-                        "status": "PERUBAHAN_SPASIAL",
-                        "batas_berubah": True,
-                        "luas_lama": 0.0,
-                        "luas_baru": area,
-                        "selisih_luas": area,
-                        "kdsubsls_lama": None,
-                        "kdsubsls_baru": None,
-                        "kdsubsls_changed": False,
-                        "type": "spatial",
-                        "area": area,
-                        "geom": geom
-                    })
-
-            self.log_detection_info(f"Layer 'SLS_Perubahan_Batas_Spasial' ditambahkan ({diff_joined.featureCount()} polygon, luas total: {sum(sc['area'] for sc in self.spatial_changes):.4f}).")
+                    total_area += area
+                    idsubsls = feat.attribute(fi_id) or "SPASIAL_" + str(feat.id())
+                    append_change(ChangeRecord(
+                        idsubsls=idsubsls,
+                        status="PERUBAHAN_SPASIAL",
+                        batas_berubah=True,
+                        luas_lama=0.0,
+                        luas_baru=area,
+                        selisih_luas=area,
+                        kdsubsls_lama=None,
+                        kdsubsls_baru=None,
+                        kdsubsls_changed=False,
+                        type="spatial",
+                        area=area,
+                        wkb=bytes(geom.asWkb())  # QgsGeometry dibangun ulang saat export
+                    ))
+
+            self.log_detection_info(f"Layer 'SLS_Perubahan_Batas_Spasial' ditambahkan ({diff_layer.featureCount()} polygon, luas total: {total_area:.4f}).")
         else:
             self.log_detection_info("Tidak ada perubahan batas spasial terdeteksi.")
             self.spatial_changes = []
 
-    def enhanced_spatial_analysis(self, old_layer, new_layer):
-        """Analisis spasial dengan multiple methods"""
+    def shapely_spatial_analysis(self, old_layer, new_layer, old_fids=None, new_fids=None):
+        """Difference kedua arah dengan shapely 2 (STRtree + GEOS vektor).
+
+        Overlay memakai seluruh fitur layer lawan, input hanya fitur old_fids/new_fids
+        (None = semua). Mengembalikan (tambahan, dihapus) berupa list (atribut, QgsGeometry).
+        """
+        def read_layer(layer, input_fids):
+            attributes, wkbs, is_input = [], [], []
+            for feat in layer.getFeatures():
+                attributes.append(feat.attributes())
+                wkbs.append(bytes(feat.geometry().asWkb()))
+                is_input.append(input_fids is None or feat.id() in input_fids)
+            return shapely.from_wkb(wkbs), attributes, np.array(is_input, dtype=np.bool_)
+
+        new_geoms, new_attrs, new_input = read_layer(new_layer, new_fids)
+        old_geoms, old_attrs, old_input = read_layer(old_layer, old_fids)
+
+        def collect(geoms, attrs, input_mask, overlay_geoms):
+            rows = np.flatnonzero(input_mask)
+            diffs = shapely_difference(geoms[rows], overlay_geoms)
+            results = []
+            for row, diff in zip(rows.tolist(), diffs):
+                if shapely.is_empty(diff):
+                    continue
+                geom = polygon_part(geometry_from_wkb(shapely.to_wkb(diff)))
+                if geom is not None:
+                    results.append((attrs[row], geom))
+            return results
+
+        return (
+            collect(new_geoms, new_attrs, new_input, old_geoms),
+            collect(old_geoms, old_attrs, old_input, new_geoms)
+        )
+
+    def enhanced_spatial_analysis(self, old_layer, new_layer, old_fids=None, new_fids=None):
+        """Analisis spasial: difference kedua arah dan symmetrical difference gabungannya"""
         try:
-            from qgis import processing
-            
-            results = {}
-            
-            # Symmetrical Difference (existing)
-            params = {
-                'INPUT': new_layer,
-                'OVERLAY': old_layer,
-                'OUTPUT': 'memory:'
-            }
-            diff_layer = processing.run("native:symmetricaldifference", params)['OUTPUT']
-            results['symmetrical'] = diff_layer
-            
-            # Difference: New - Old (tambahan di file baru)
-            params_diff_new = {
-                'INPUT': new_layer,
-                'OVERLAY': old_layer,
-                'OUTPUT': 'memory:'
-            }
-            diff_new = processing.run("native:difference", params_diff_new)['OUTPUT']
-            results['added_areas'] = diff_new
-            
-            # Difference: Old - New (yang hilang di file baru)
-            params_diff_old = {
-                'INPUT': old_layer,
-                'OVERLAY': new_layer,
-                'OUTPUT': 'memory:'
+            differences = None
+            if HAS_SHAPELY:
+                try:
+                    differences = self.shapely_spatial_analysis(old_layer, new_layer, old_fids, new_fids)
+                except Exception as e:
+                    self.log_detection_info(f"Analisis shapely gagal, memakai QgsSpatialIndex: {str(e)}")
+
+            if differences is None:
+                # Difference: New - Old (tambahan di file baru) dan Old - New (yang hilang)
+                differences = (
+                    indexed_difference(new_layer, self.get_spatial_index(old_layer), new_fids),
+                    indexed_difference(old_layer, self.get_spatial_index(new_layer), old_fids)
+                )
+            added, removed = differences
+
+            # Symmetrical difference = gabungan kedua arah, idsubsls dibawa dari fitur asal
+            sym_fields = QgsFields()
+            sym_fields.append(new_layer.fields().field("idsubsls"))
+            sym_fields.append(QgsField("sumber", QVariant.String))
+            fi_new = new_layer.fields().indexOf("idsubsls")
+            fi_old = old_layer.fields().indexOf("idsubsls")
+            symmetrical = (
+                [([attrs[fi_new], "baru"], geom) for attrs, geom in added] +
+                [([attrs[fi_old], "lama"], geom) for attrs, geom in removed]
+            )
+
+            results = {
+                'symmetrical': create_memory_layer("symmetrical_difference", new_layer.crs(), sym_fields, symmetrical),
+                'added_areas': create_memory_layer("difference_baru", new_layer.crs(), new_layer.fields(), added),
+                'removed_areas': create_memory_layer("difference_lama", old_layer.crs(), old_layer.fields(), removed),
             }
-            diff_old = processing.run("native:difference", params_diff_old)['OUTPUT']
-            results['removed_areas'] = diff_old
-            
-            # Tambahkan layer tambahan ke peta
-            if diff_new.featureCount() > 0:
-                diff_new.setName("SLS_Area_Tambahan")
-                symbol_add = QgsFillSymbol.createSimple({
-                    'color': '0,255,0,100',
-                    'outline_color': '0,255,0',
-                    'outline_width': '0.5'
-                })
-                diff_new.setRenderer(QgsSingleSymbolRenderer(symbol_add))
-                QgsProject.instance().addMapLayer(diff_new)
-                
-            if diff_old.featureCount() > 0:
-                diff_old.setName("SLS_Area_Dihapus")
-                symbol_remove = QgsFillSymbol.createSimple({
-                    'color': '255,255,0,100',
-                    'outline_color': '255,255,0',
-                    'outline_width': '0.5'
-                })
-                diff_old.setRenderer(QgsSingleSymbolRenderer(symbol_remove))
-                QgsProject.instance().addMapLayer(diff_old)
-            
+            self.add_difference_layers(results['added_areas'], results['removed_areas'])
             return results
             
         except Exception as e:
             self.log_detection_info(f"Error analisis spasial: {str(e)}")
             return {}
 
+    def add_difference_layers(self, diff_new, diff_old):
+        """Tambahkan layer area tambahan/dihapus ke peta"""
+        if diff_new.featureCount() > 0:
+            diff_new.setName("SLS_Area_Tambahan")
+            symbol_add = QgsFillSymbol.createSimple({
+                'color': '0,255,0,100',
+                'outline_color': '0,255,0',
+                'outline_width': '0.5'
+            })
+            diff_new.setRenderer(QgsSingleSymbolRenderer(symbol_add))
+            QgsProject.instance().addMapLayer(diff_new)
+            
+        if diff_old.featureCount() > 0:
+            diff_old.setName("SLS_Area_Dihapus")
+            symbol_remove = QgsFillSymbol.createSimple({
+                'color': '255,255,0,100',
+                'outline_color': '255,255,0',
+                'outline_width': '0.5'
+            })
+            diff_old.setRenderer(QgsSingleSymbolRenderer(symbol_remove))
+            QgsProject.instance().addMapLayer(diff_old)
+
     def export_combined_to_csv(self):
         """Export hasil gabungan ke CSV"""
         if not self.combined_report:
             QMessageBox.warning(self, "Peringatan", "Tidak ada data untuk di-export.")
             return
 
-        default_name = "SLS_Laporan_Gabungan_" + time.strftime("%Y%m%d_%H%M%S") + ".csv"
+        default_name = f"SLS_Laporan_Gabungan_{QDateTime.currentDateTime().toString('yyyyMMdd_HHmmss')}.csv"
         save_path, _ = QFileDialog.getSaveFileName(
             self, "Simpan Laporan Gabungan ke CSV", default_name, "CSV Files (*.csv)"
         )
@@ -583,49 +1156,46 @@ Perubahan terdeteksi:
         if not save_path.lower().endswith('.csv'):
             save_path += '.csv'
 
+        def csv_row(item):
+            is_spatial = item.type == "spatial"
+            if is_spatial:
+                catatan = "Perubahan batas spasial (symmetrical difference)"
+            elif item.status == "DIUBAH":
+                catatan = []
+                if item.batas_berubah:
+                    catatan.append("Batas berubah (luas)")
+                if item.kdsubsls_changed:
+                    catatan.append("kdsubsls berubah")
+                catatan = "; ".join(catatan)
+            else:
+                catatan = item.status
+
+            return (
+                item.idsubsls,
+                item.status,
+                item.type,
+                "Ya" if item.batas_berubah else "Tidak",
+                "" if is_spatial else f"{item.luas_lama:.4f}",
+                "" if is_spatial else f"{item.luas_baru:.4f}",
+                "" if is_spatial else f"{item.selisih_luas:+.4f}",
+                f"{item.area:.4f}" if is_spatial else "",
+                item.kdsubsls_lama if item.kdsubsls_lama is not None else "NULL",
+                item.kdsubsls_baru if item.kdsubsls_baru is not None else "NULL",
+                "Ya" if item.kdsubsls_changed else "Tidak",
+                "Ya" if item.idsubsls in self.duplicate_ids_new else "Tidak",
+                catatan
+            )
+
         try:
-            with open(save_path, 'w', newline='', encoding='utf-8') as csvfile:
+            with open(save_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
                 fieldnames = [
                     "idsubsls", "Status", "Tipe_Perubahan", "Perubahan_Batas_SLS",
                     "Luas_Lama", "Luas_Baru", "Selisih_Luas", "Luas_Perubahan_Spasial",
                     "kdsubsls_Lama", "kdsubsls_Baru", "Perubahan_kdsubsls", "Duplikat_File_Baru", "Catatan"
                 ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-
-                for item in self.combined_report:
-                    is_duplicate = "Ya" if item["idsubsls"] in self.duplicate_ids_new else "Tidak"
-                    
-                    if item["type"] == "spatial":
-                        catatan = "Perubahan batas spasial (symmetrical difference)"
-                        luas_spasial = f"{item.get('area', 0.0):.4f}"
-                    else:
-                        catatan = []
-                        if item["status"] == "DIUBAH":
-                            if item["batas_berubah"]:
-                                catatan.append("Batas berubah (luas)")
-                            if item["kdsubsls_changed"]:
-                                catatan.append("kdsubsls berubah")
-                        else:
-                            catatan.append(item["status"])
-                        catatan = "; ".join(catatan)
-                        luas_spasial = ""
-
-                    writer.writerow({
-                        "idsubsls": item["idsubsls"],
-                        "Status": item["status"],
-                        "Tipe_Perubahan": item["type"],
-                        "Perubahan_Batas_SLS": "Ya" if item["batas_berubah"] else "Tidak",
-                        "Luas_Lama": f"{item['luas_lama']:.4f}" if item["type"] != "spatial" else "",
-                        "Luas_Baru": f"{item['luas_baru']:.4f}" if item["type"] != "spatial" else "",
-                        "Selisih_Luas": f"{item['selisih_luas']:+.4f}" if item["type"] != "spatial" else "",
-                        "Luas_Perubahan_Spasial": luas_spasial,
-                        "kdsubsls_Lama": item["kdsubsls_lama"] if item["kdsubsls_lama"] is not None else "NULL",
-                        "kdsubsls_Baru": item["kdsubsls_baru"] if item["kdsubsls_baru"] is not None else "NULL",
-                        "Perubahan_kdsubsls": "Ya" if item["kdsubsls_changed"] else "Tidak",
-                        "Duplikat_File_Baru": is_duplicate,
-                        "Catatan": catatan
-                    })
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames)
+                writer.writerows(csv_row(item) for item in self.combined_report)
 
             QMessageBox.information(self, "Sukses", f"Laporan gabungan berhasil di-export ke:\n{save_path}")
 
@@ -638,6 +1208,13 @@ Perubahan terdeteksi:
             QMessageBox.warning(self, "Peringatan", "Tidak ada data untuk di-export.")
             return
 
+        # Hanya baris dengan geometri yang bisa di-export; cek sebelum membuka writer
+        geom_rows = [change for change in self.combined_report if change.wkb]
+        if not geom_rows:
+            QMessageBox.warning(self, "Peringatan", 
+                "Tidak ada features dengan geometri yang bisa di-export.")
+            return
+
         save_path, _ = QFileDialog.getSaveFileName(
             self, "Simpan ke GeoPackage", "", "GeoPackage (*.gpkg)"
         )
@@ -648,67 +1225,71 @@ Perubahan terdeteksi:
         try:
             # Buat layer output
             fields = QgsFields()
-            fields.append(QgsField("idsubsls", QVariant.String))
-            fields.append(QgsField("status", QVariant.String))
-            fields.append(QgsField("tipe_perubahan", QVariant.String))
-            fields.append(QgsField("batas_berubah", QVariant.String))
-            fields.append(QgsField("luas_lama", QVariant.Double))
-            fields.append(QgsField("luas_baru", QVariant.Double))
-            fields.append(QgsField("selisih_luas", QVariant.Double))
-            fields.append(QgsField("kdsubsls_lama", QVariant.String))
-            fields.append(QgsField("kdsubsls_baru", QVariant.String))
-            fields.append(QgsField("kdsubsls_changed", QVariant.String))
-            fields.append(QgsField("duplikat", QVariant.String))
+            for name, field_type in (
+                ("idsubsls", QVariant.String),
+                ("status", QVariant.String),
+                ("tipe_perubahan", QVariant.String),
+                ("batas_berubah", QVariant.String),
+                ("luas_lama", QVariant.Double),
+                ("luas_baru", QVariant.Double),
+                ("selisih_luas", QVariant.Double),
+                ("kdsubsls_lama", QVariant.String),
+                ("kdsubsls_baru", QVariant.String),
+                ("kdsubsls_changed", QVariant.String),
+                ("duplikat", QVariant.String),
+            ):
+                fields.append(QgsField(name, field_type))
             
-            crs = QgsProject.instance().crs()
-            writer = QgsVectorFileWriter(
-                save_path, 
-                "UTF-8", 
-                fields, 
-                QgsWkbTypes.Polygon, 
-                crs, 
-                "GPKG"
+            # Features diisi ke memory layer sekaligus, lalu ditulis ke GPKG dalam satu panggilan
+            export_layer = QgsVectorLayer("Polygon", "sls_export", "memory")
+            export_layer.setCrs(QgsProject.instance().crs())
+            export_layer.dataProvider().addAttributes(fields.toList())
+            export_layer.updateFields()
+            layer_fields = export_layer.fields()
+                
+            features = [None] * len(geom_rows)
+            for i, change in enumerate(geom_rows):
+                feat = QgsFeature(layer_fields)
+                feat.setGeometry(geometry_from_wkb(change.wkb))
+                
+                is_duplicate = "Ya" if change.idsubsls in self.duplicate_ids_new else "Tidak"
+                
+                feat.setAttributes([
+                    change.idsubsls,
+                    change.status,
+                    change.type,
+                    "Ya" if change.batas_berubah else "Tidak",
+                    change.luas_lama,
+                    change.luas_baru,
+                    change.selisih_luas,
+                    str(change.kdsubsls_lama) if change.kdsubsls_lama is not None else "NULL",
+                    str(change.kdsubsls_baru) if change.kdsubsls_baru is not None else "NULL",
+                    "Ya" if change.kdsubsls_changed else "Tidak",
+                    is_duplicate
+                ])
+                features[i] = feat
+
+            provider = export_layer.dataProvider()
+            ok, _ = provider.addFeatures(features, QgsFeatureSink.FastInsert)
+            if not ok:
+                QMessageBox.critical(self, "Error", f"Error menyiapkan features untuk export: {provider.lastError()}")
+                return
+
+            options = QgsVectorFileWriter.SaveVectorOptions()
+            options.driverName = "GPKG"
+            options.fileEncoding = "UTF-8"
+            error, error_message, _, _ = QgsVectorFileWriter.writeAsVectorFormatV3(
+                export_layer, save_path, QgsProject.instance().transformContext(), options
             )
             
-            if writer.hasError() != QgsVectorFileWriter.NoError:
-                QMessageBox.critical(self, "Error", f"Error membuat file: {writer.errorMessage()}")
+            if error != QgsVectorFileWriter.NoError:
+                QMessageBox.critical(self, "Error", f"Error membuat file: {error_message}")
                 return
-                
-            # Tambahkan features yang memiliki geometri
-            features_added = 0
-            for change in self.combined_report:
-                if change.get('geom') and change['geom'] is not None:
-                    feat = QgsFeature()
-                    feat.setGeometry(change['geom'])
-                    
-                    is_duplicate = "Ya" if change["idsubsls"] in self.duplicate_ids_new else "Tidak"
-                    
-                    feat.setAttributes([
-                        change['idsubsls'],
-                        change['status'],
-                        change['type'],
-                        "Ya" if change["batas_berubah"] else "Tidak",
-                        change['luas_lama'],
-                        change['luas_baru'],
-                        change['selisih_luas'],
-                        str(change['kdsubsls_lama']) if change['kdsubsls_lama'] is not None else "NULL",
-                        str(change['kdsubsls_baru']) if change['kdsubsls_baru'] is not None else "NULL",
-                        "Ya" if change["kdsubsls_changed"] else "Tidak",
-                        is_duplicate
-                    ])
-                    writer.addFeature(feat)
-                    features_added += 1
             
-            del writer  # Important: close the writer
-            
-            if features_added > 0:
-                QMessageBox.information(self, "Sukses", 
-                    f"Data berhasil di-export ke GeoPackage!\n"
-                    f"Total features: {features_added}\n"
-                    f"File: {save_path}")
-            else:
-                QMessageBox.warning(self, "Peringatan", 
-                    "Tidak ada features dengan geometri yang bisa di-export.")
+            QMessageBox.information(self, "Sukses", 
+                f"Data berhasil di-export ke GeoPackage!\n"
+                f"Total features: {len(features)}\n"
+                f"File: {save_path}")
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Gagal export ke GeoPackage:\n{str(e)}")